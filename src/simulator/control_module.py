@@ -2,10 +2,14 @@
 Therac-25 Control Module
 Manages machine state with intentional bugs for educational purposes
 """
+import queue
+import re
 import threading
 import time
+import weakref
+from collections import namedtuple
 from enum import Enum
-from typing import Dict, Any
+from typing import Any
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,7 +26,54 @@ class BeamMode(Enum):
     XRAY = "xray"
     ELECTRON = "electron"
 
+# Single precompiled search for the fire_beam results that would harm a patient
+_DANGER_SEARCH = re.compile("LETHAL|OVERDOSE").search
+
+def is_dangerous(result: str) -> bool:
+    """True if a fire_beam result means a lethal dose or an overdose"""
+    return _DANGER_SEARCH(result) is not None
+
+# Snapshot returned by get_status (field order matches the old status dict)
+Status = namedtuple("Status", (
+    "state", "beam_mode", "dose", "position", "setup_counter",
+    "turntable_position", "turntable_moving", "version"
+))
+
+# Member -> value tables, cheaper than the Enum .value descriptor in get_status
+_STATE_VALUE = {m: m.value for m in MachineState}
+_BEAM_VALUE = {m: m.value for m in BeamMode}
+
+# Editable field -> attribute holding it
+_EDIT_ATTRS = {"dose": "dose_value", "position_x": "position_x", "position_y": "position_y"}
+
+def _turntable_worker(control_ref, commands):
+    """Persistent hardware thread: performs queued turntable movements in order"""
+    while True:
+        target_mode = commands.get()
+        # Moves queued meanwhile are merged: the turntable heads straight for the latest target
+        moves = 1
+        while target_mode is not None:
+            try:
+                next_mode = commands.get_nowait()
+            except queue.Empty:
+                break
+            target_mode = next_mode
+            moves += 1
+        control = control_ref()
+        if target_mode is None or control is None:
+            return
+        control._move_turntable(target_mode, moves)
+        del control
+
 class ControlModule:
+    __slots__ = (
+        "version", "state", "beam_mode", "dose_value", "position_x", "position_y",
+        "setup_counter", "max_counter", "state_lock", "hardware_ready_event",
+        "turntable_position", "turntable_moving", "keystroke_delay",
+        "_turntable_queue", "_turntable_thread", "_turntable_lock", "_turntable_pending",
+        "_counter_lock", "__weakref__"
+    )
+
     def __init__(self, version="buggy"):
         self.version = version
         self.state = MachineState.STARTUP
@@ -35,9 +86,12 @@ class ControlModule:
         if version == "buggy":
             self.setup_counter = 0  # Will overflow at 256
             self.max_counter = 255
+            self._counter_lock = None  # Plain read-modify-write, like the original
         else:
             self.setup_counter = 0  # 32-bit in fixed version
             self.max_counter = 2**31 - 1
+            # FIXED: own lock for the counter, so setups never wait behind a mode change
+            self._counter_lock = threading.Lock()
 
         # BUG 1: No proper synchronization in buggy version
         if version == "fixed":
@@ -50,8 +104,37 @@ class ControlModule:
         self.turntable_position = "xray"  # Hardware position
         self.turntable_moving = False
 
+        # Simulated cursor keystroke time per edit (tests/benchmarks may set 0)
+        self.keystroke_delay = 0.1
+
+        # Single hardware thread fed through a queue instead of one thread per mode change;
+        # the pending count keeps turntable_moving set until every queued move is done
+        self._turntable_lock = threading.Lock()
+        self._turntable_pending = 0
+        self._turntable_queue = queue.SimpleQueue()
+        self._turntable_thread = threading.Thread(
+            target=_turntable_worker,
+            args=(weakref.ref(self), self._turntable_queue),
+            daemon=True
+        )
+        self._turntable_thread.start()
+        weakref.finalize(self, self._turntable_queue.put, None)
+
         logger.info(f"ControlModule initialized in {version} mode")
 
+    def reset(self):
+        """Return to the power-on state in place (no turntable movement may be pending)"""
+        self.state = MachineState.STARTUP
+        self.beam_mode = BeamMode.XRAY
+        self.dose_value = 0
+        self.position_x = 0
+        self.position_y = 0
+        self.setup_counter = 0
+        self.turntable_position = "xray"
+        self.turntable_moving = False
+        if self.hardware_ready_event:
+            self.hardware_ready_event.clear()
+
     def change_mode(self, new_mode: BeamMode):
         """BUG 1: Race condition - doesn't wait for hardware in buggy version"""
         logger.info(f"Changing mode from {self.beam_mode} to {new_mode}")
@@ -68,10 +151,14 @@ class ControlModule:
         self.beam_mode = new_mode
 
         # Start turntable movement
-        if old_mode != new_mode:
-            self.turntable_moving = True
+        if old_mode is not new_mode:
+            with self._turntable_lock:
+                self._turntable_pending += 1
+                self.turntable_moving = True
+            if self.hardware_ready_event:
+                self.hardware_ready_event.clear()
             # Simulate hardware movement
-            threading.Thread(target=self._move_turntable, args=(new_mode,)).start()
+            self._turntable_queue.put(new_mode)
 
         if self.version == "fixed":
             # FIXED: Wait for hardware confirmation
@@ -87,13 +174,21 @@ class ControlModule:
 
         return True
 
-    def _move_turntable(self, target_mode: BeamMode):
-        """Simulates hardware turntable movement"""
+    def _move_turntable(self, target_mode: BeamMode, moves: int = 1):
+        """Simulates hardware turntable movement (covering `moves` queued mode changes)"""
         # Realistic hardware delay
         time.sleep(0.5)
 
-        self.turntable_position = "electron" if target_mode == BeamMode.ELECTRON else "xray"
-        self.turntable_moving = False
+        with self._turntable_lock:
+            self.turntable_position = "electron" if target_mode is BeamMode.ELECTRON else "xray"
+            self._turntable_pending -= moves
+            settled = self._turntable_pending == 0
+            if settled:
+                self.turntable_moving = False
+
+        if not settled:
+            # More moves are queued; the turntable has not stopped yet
+            return
 
         if self.version == "fixed" and self.hardware_ready_event:
             self.hardware_ready_event.set()
@@ -106,9 +201,18 @@ class ControlModule:
 
         # Increment setup counter
         if self.version == "buggy":
-            self.setup_counter = (self.setup_counter + 1) % 256  # OVERFLOW BUG!
+            self.setup_counter = (self.setup_counter + 1) & 0xFF  # OVERFLOW BUG! (8-bit wrap)
         else:
-            self.setup_counter += 1
+            # FIXED: the read-modify-write is serialized, so concurrent setups lose no counts
+            with self._counter_lock:
+                limit_reached = self.setup_counter >= self.max_counter
+                if not limit_reached:
+                    self.setup_counter += 1
+            if limit_reached:
+                # FIXED: refuse to count past the limit instead of wrapping around
+                logger.error("Safety: Setup counter limit reached - setup refused")
+                self.state = MachineState.ERROR
+                return False
 
         logger.info(f"Setup counter: {self.setup_counter}")
 
@@ -132,29 +236,54 @@ class ControlModule:
         self.state = MachineState.READY
         return True
 
+    def bulk_setup(self, n: int, dose: int, x: int, y: int):
+        """Equivalent of n identical setup_treatment calls: one counter step, one validation"""
+        if self.version == "buggy":
+            self.setup_counter = (self.setup_counter + n) & 0xFF  # Same 8-bit wrap as setup_treatment
+        else:
+            with self._counter_lock:
+                limit_reached = self.setup_counter + n > self.max_counter
+                if not limit_reached:
+                    self.setup_counter += n
+            if limit_reached:
+                logger.error("Safety: Setup counter limit reached - setup refused")
+                self.state = MachineState.ERROR
+                return False
+
+        logger.info(f"Setup counter advanced by {n}: {self.setup_counter}")
+
+        self.dose_value = dose
+        self.position_x = x
+        self.position_y = y
+
+        # Same validation as the last of the n setups (bypassed when counter = 0 in buggy version)
+        if self.setup_counter != 0 or self.version == "fixed":
+            if dose <= 0 or dose > 1000:
+                self.state = MachineState.ERROR
+                return False
+
+        self.state = MachineState.READY
+        return True
+
     def edit_treatment(self, field: str, value: Any):
         """BUG 3: Edit race condition - partial state updates"""
         logger.info(f"Editing {field} to {value}")
 
+        attr = _EDIT_ATTRS.get(field)
+        if attr is None:
+            return True
+
+        # BUG 3: Simulate cursor editing during state transition (keystroke delay)
+        if self.keystroke_delay:
+            time.sleep(self.keystroke_delay)
+
         if self.version == "fixed" and self.state_lock:
+            # FIXED: typing happens outside the lock; only publishing the value is serialized
             with self.state_lock:
-                return self._edit_internal(field, value)
+                setattr(self, attr, value)
         else:
             # BUGGY: No synchronization during edit
-            return self._edit_internal(field, value)
-
-    def _edit_internal(self, field: str, value: Any):
-        # BUG 3: Simulate cursor editing during state transition
-        if field == "dose":
-            # Simulate keystroke delay
-            time.sleep(0.1)
-            self.dose_value = value
-        elif field == "position_x":
-            time.sleep(0.1)
-            self.position_x = value
-        elif field == "position_y":
-            time.sleep(0.1)
-            self.position_y = value
+            setattr(self, attr, value)
 
         return True
 
@@ -167,7 +296,7 @@ class ControlModule:
             if self.version == "buggy":
                 logger.critical("ACCIDENT: Firing while turntable moving!")
                 logger.critical(f"Beam mode: {self.beam_mode}, Hardware position: {self.turntable_position}")
-                if self.beam_mode == BeamMode.ELECTRON and self.turntable_position == "xray":
+                if self.beam_mode is BeamMode.ELECTRON and self.turntable_position == "xray":
                     logger.critical("LETHAL: High-power electron beam without scattering target!")
                     return "LETHAL_OVERDOSE"
             else:
@@ -175,7 +304,7 @@ class ControlModule:
                 return "SAFETY_ABORT"
 
         # Check mode/hardware consistency
-        expected_pos = "electron" if self.beam_mode == BeamMode.ELECTRON else "xray"
+        expected_pos = "electron" if self.beam_mode is BeamMode.ELECTRON else "xray"
         if self.turntable_position != expected_pos:
             if self.version == "buggy":
                 logger.critical("ACCIDENT: Beam/hardware mismatch!")
@@ -187,7 +316,6 @@ class ControlModule:
         self.state = MachineState.FIRING
 
         # Simulate beam firing time
-        import time
         time.sleep(0.5)
 
         # Return to ready state after firing
@@ -196,15 +324,15 @@ class ControlModule:
         logger.info(f"Beam fired safely: {self.beam_mode} mode, dose {self.dose_value}")
         return "SUCCESS"
 
-    def get_status(self) -> Dict[str, Any]:
+    def get_status(self) -> Status:
         """Get current system status"""
-        return {
-            "state": self.state.value,
-            "beam_mode": self.beam_mode.value,
-            "dose": self.dose_value,
-            "position": (self.position_x, self.position_y),
-            "setup_counter": self.setup_counter,
-            "turntable_position": self.turntable_position,
-            "turntable_moving": self.turntable_moving,
-            "version": self.version
-        }
\ No newline at end of file
+        return Status(
+            _STATE_VALUE[self.state],
+            _BEAM_VALUE[self.beam_mode],
+            self.dose_value,
+            (self.position_x, self.position_y),
+            self.setup_counter,
+            self.turntable_position,
+            self.turntable_moving,
+            self.version
+        )
@@ -6,7 +6,27 @@ import argparse
 import logging
 import time
 import sys
-from control_module import ControlModule, BeamMode
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from control_module import ControlModule, BeamMode, is_dangerous
+
+# Worker pool for concurrent operator actions, created once per program run
+_operator_pool = ThreadPoolExecutor(max_workers=2)
+
+# Editable fields whose values are integers
+_INT_FIELDS = frozenset(("dose", "position_x", "position_y"))
+
+# Section headers, built once: blank line, separator, title, separator
+_SEP = "=" * 60
+
+def _header(title: str) -> str:
+    return f"\n{_SEP}\n{title}\n{_SEP}"
+
+_HDR_S1 = _header("DEMONSTRATING ACCIDENT SCENARIO 1: Mode Change Race Condition")
+_HDR_S2 = _header("DEMONSTRATING ACCIDENT SCENARIO 2: Counter Overflow")
+_HDR_S3 = _header("DEMONSTRATING ACCIDENT SCENARIO 3: Edit Race Condition")
+_HDR_INTERACTIVE = _header("INTERACTIVE MODE - Manual Therac-25 Operation")
+_HDR_SUMMARY = _header("SIMULATION SUMMARY")
 
 def setup_logging():
     """Configure logging for simulation"""
@@ -20,29 +40,31 @@ def demonstrate_accident_scenario_1(control: ControlModule):
     Accident Scenario 1: X-ray to Electron mode change race condition
     This reproduces the exact sequence that caused overdoses
     """
-    print("\n" + "="*60)
-    print("DEMONSTRATING ACCIDENT SCENARIO 1: Mode Change Race Condition")
-    print("="*60)
+    _out = []
+    _emit = _out.append
+
+    _emit(_HDR_S1)
 
     # Set up X-ray treatment
-    print("1. Setting up X-ray treatment...")
+    _emit("1. Setting up X-ray treatment...")
     control.setup_treatment(dose=200, x=10, y=15)
     control.change_mode(BeamMode.XRAY)
 
     # Operator realizes mistake and quickly changes to electron mode
-    print("2. Operator quickly changes to Electron mode...")
+    _emit("2. Operator quickly changes to Electron mode...")
     control.change_mode(BeamMode.ELECTRON)
 
     # Fire immediately (this is where the bug happens)
-    print("3. Firing beam immediately...")
+    _emit("3. Firing beam immediately...")
     result = control.fire_beam()
 
-    print(f"RESULT: {result}")
-    if "LETHAL" in result or "OVERDOSE" in result:
-        print("💀 PATIENT WOULD RECEIVE LETHAL RADIATION DOSE")
+    _emit(f"RESULT: {result}")
+    if is_dangerous(result):
+        _emit("💀 PATIENT WOULD RECEIVE LETHAL RADIATION DOSE")
     else:
-        print("✅ Safety systems prevented accident")
+        _emit("✅ Safety systems prevented accident")
 
+    sys.stdout.write("\n".join(_out) + "\n")
     return result
 
 def demonstrate_accident_scenario_2(control: ControlModule):
@@ -50,111 +72,140 @@ def demonstrate_accident_scenario_2(control: ControlModule):
     Accident Scenario 2: Counter overflow bypassing safety
     After 256 setups, safety checks are bypassed
     """
-    print("\n" + "="*60)
-    print("DEMONSTRATING ACCIDENT SCENARIO 2: Counter Overflow")
-    print("="*60)
+    _out = []
+    _emit = _out.append
 
-    # Simulate 255 previous setups
-    print("1. Simulating 255 previous treatments...")
-    for i in range(255):
-        control.setup_treatment(dose=100, x=0, y=0)
-        if i % 50 == 0:
-            print(f"   Setup {i}/255 complete...")
+    _emit(_HDR_S2)
 
-    print(f"Counter at: {control.setup_counter}")
+    # Simulate 255 previous routine setups in one step
+    _emit("1. Simulating 255 previous treatments...")
+    control.bulk_setup(255, dose=100, x=0, y=0)
+
+    _emit(f"Counter at: {control.setup_counter}")
 
     # The 256th setup (counter overflows to 0)
-    print("2. Setup #256 - COUNTER OVERFLOWS...")
+    _emit("2. Setup #256 - COUNTER OVERFLOWS...")
     control.setup_treatment(dose=9999, x=0, y=0)  # Invalid dose!
 
-    print(f"Counter after overflow: {control.setup_counter}")
+    _emit(f"Counter after overflow: {control.setup_counter}")
 
     # Try to fire with invalid settings
-    print("3. Attempting to fire with invalid dose...")
+    _emit("3. Attempting to fire with invalid dose...")
     result = control.fire_beam()
 
-    print(f"RESULT: {result}")
+    _emit(f"RESULT: {result}")
     if control.version == "buggy" and control.setup_counter == 0:
-        print("💀 SAFETY CHECKS BYPASSED - MASSIVE OVERDOSE POSSIBLE")
+        _emit("💀 SAFETY CHECKS BYPASSED - MASSIVE OVERDOSE POSSIBLE")
     else:
-        print("✅ Safety systems caught invalid dose")
+        _emit("✅ Safety systems caught invalid dose")
 
+    sys.stdout.write("\n".join(_out) + "\n")
     return result
 
 def demonstrate_accident_scenario_3(control: ControlModule):
     """
     Accident Scenario 3: Edit race condition during setup
     """
-    print("\n" + "="*60)
-    print("DEMONSTRATING ACCIDENT SCENARIO 3: Edit Race Condition")
-    print("="*60)
+    _out = []
+    _emit = _out.append
+
+    _emit(_HDR_S3)
 
     # Start treatment setup
-    print("1. Setting up treatment...")
+    _emit("1. Setting up treatment...")
     control.setup_treatment(dose=200, x=10, y=15)
 
     # Simulate operator editing while system is busy
-    print("2. Operator edits dose while system is processing...")
+    _emit("2. Operator edits dose while system is processing...")
 
     # Create race condition - edit during state transition
-    import threading
-
     def edit_dose():
         time.sleep(0.05)  # Small delay to create race
         control.edit_treatment("dose", 999)
 
-    edit_thread = threading.Thread(target=edit_dose)
-    edit_thread.start()
+    edit_future = _operator_pool.submit(edit_dose)
 
     # Immediately try to fire
     control.change_mode(BeamMode.ELECTRON)
     result = control.fire_beam()
 
-    edit_thread.join()
+    edit_future.result()
 
-    print(f"RESULT: {result}")
-    print(f"Final dose value: {control.dose_value}")
+    _emit(f"RESULT: {result}")
+    _emit(f"Final dose value: {control.dose_value}")
 
+    sys.stdout.write("\n".join(_out) + "\n")
     return result
 
+# Scenario id -> demonstration, in the order "all" runs them
+_SCENARIOS = {
+    "1": demonstrate_accident_scenario_1,
+    "2": demonstrate_accident_scenario_2,
+    "3": demonstrate_accident_scenario_3,
+}
+
 def interactive_mode(control: ControlModule):
     """Interactive mode for manual testing"""
-    print("\n" + "="*60)
-    print("INTERACTIVE MODE - Manual Therac-25 Operation")
-    print("="*60)
+    print(_HDR_INTERACTIVE)
     print("Commands: setup <dose> <x> <y>, mode <xray|electron>, fire, edit <field> <value>, status, quit")
 
+    # Resolve enum members and bound methods once instead of on every command
+    xray, electron = BeamMode.XRAY, BeamMode.ELECTRON
+    setup, change_mode, fire = control.setup_treatment, control.change_mode, control.fire_beam
+    edit, get_status = control.edit_treatment, control.get_status
+
+    def handle_setup(cmd):
+        dose, x, y = int(cmd[1]), int(cmd[2]), int(cmd[3])
+        result = setup(dose, x, y)
+        print(f"Setup: {'Success' if result else 'Failed'}")
+
+    def handle_mode(cmd):
+        mode = xray if cmd[1] == "xray" else electron
+        result = change_mode(mode)
+        print(f"Mode change: {'Success' if result else 'Failed'}")
+
+    def handle_fire(cmd):
+        result = fire()
+        print(f"Fire result: {result}")
+
+    def handle_edit(cmd):
+        field, value = cmd[1], cmd[2]
+        if field in _INT_FIELDS:
+            value = int(value)
+        result = edit(field, value)
+        print(f"Edit: {'Success' if result else 'Failed'}")
+
+    def handle_status(cmd):
+        status = get_status()
+        for key, value in zip(status._fields, status):
+            print(f"  {key}: {value}")
+
+    # Command table: name -> (required token count or None for any, handler); quit has no handler
+    commands = {
+        "setup": (4, handle_setup),
+        "mode": (2, handle_mode),
+        "fire": (None, handle_fire),
+        "edit": (3, handle_edit),
+        "status": (None, handle_status),
+        "quit": (None, None),
+    }
+
     while True:
         try:
-            cmd = input("\ntherac-25> ").strip().split()
+            # No command takes more than four tokens; a fifth (holding the rest) marks the input too long
+            cmd = input("\ntherac-25> ").split(maxsplit=4)
             if not cmd:
                 continue
 
-            if cmd[0] == "quit":
-                break
-            elif cmd[0] == "setup" and len(cmd) == 4:
-                dose, x, y = int(cmd[1]), int(cmd[2]), int(cmd[3])
-                result = control.setup_treatment(dose, x, y)
-                print(f"Setup: {'Success' if result else 'Failed'}")
-            elif cmd[0] == "mode" and len(cmd) == 2:
-                mode = BeamMode.XRAY if cmd[1] == "xray" else BeamMode.ELECTRON
-                result = control.change_mode(mode)
-                print(f"Mode change: {'Success' if result else 'Failed'}")
-            elif cmd[0] == "fire":
-                result = control.fire_beam()
-                print(f"Fire result: {result}")
-            elif cmd[0] == "edit" and len(cmd) == 3:
-                field, value = cmd[1], cmd[2]
-                if field in ["dose", "position_x", "position_y"]:
-                    value = int(value)
-                result = control.edit_treatment(field, value)
-                print(f"Edit: {'Success' if result else 'Failed'}")
-            elif cmd[0] == "status":
-                status = control.get_status()
-                for key, value in status.items():
-                    print(f"  {key}: {value}")
-            else:
+            entry = commands.get(cmd[0])
+            if entry is None or (entry[0] is not None and len(cmd) != entry[0]):
                 print("Invalid command. Try: setup, mode, fire, edit, status, quit")
+                continue
+
+            handler = entry[1]
+            if handler is None:
+                break
+            handler(cmd)
 
         except (ValueError, IndexError):
             print("Invalid command format.")
@@ -187,27 +238,12 @@ def main():
     if args.scenario == "interactive":
         interactive_mode(control)
     else:
-        scenarios = []
-        if args.scenario == "all":
-            scenarios = ["1", "2", "3"]
-        else:
-            scenarios = [args.scenario]
-
-        results = []
-        for scenario in scenarios:
-            if scenario == "1":
-                result = demonstrate_accident_scenario_1(control)
-            elif scenario == "2":
-                result = demonstrate_accident_scenario_2(control)
-            elif scenario == "3":
-                result = demonstrate_accident_scenario_3(control)
-            results.append(result)
+        scenarios = list(_SCENARIOS) if args.scenario == "all" else [args.scenario]
+        results = [_SCENARIOS[scenario](control) for scenario in scenarios]
 
         # Summary
-        print("\n" + "="*60)
-        print("SIMULATION SUMMARY")
-        print("="*60)
-        accidents = sum(1 for r in results if "LETHAL" in r or "OVERDOSE" in r)
+        print(_HDR_SUMMARY)
+        accidents = Counter(map(is_dangerous, results))[True]
         print(f"Version: {args.version}")
         print(f"Scenarios run: {len(results)}")
         print(f"Accidents: {accidents}")
@@ -0,0 +1,28 @@
+"""
+Shared pytest fixtures
+"""
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from src.simulator.control_module import ControlModule
+
+def pytest_configure(config):
+    # Registered here too so the marker is known when pytest-xdist is not installed
+    config.addinivalue_line(
+        "markers", "xdist_group(name): run all tests of the group on the same xdist worker"
+    )
+
+@pytest.fixture
+def buggy_control():
+    """Fresh control module reproducing the original bugs"""
+    return ControlModule(version="buggy")
+
+@pytest.fixture
+def fixed_control():
+    """Fresh control module with the safety fixes"""
+    return ControlModule(version="fixed")
+
+@pytest.fixture(scope="session")
+def executor():
+    """Thread pool reused by the concurrency tests instead of new threads per test"""
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        yield pool
@@ -0,0 +1,48 @@
+"""
+Integration Tests - Web Interface Sessions
+Tests how the Flask app keeps one control module per browser session
+"""
+import pytest
+
+pytest.importorskip("flask")
+
+from src.web_interface import app as web_app
+
+@pytest.fixture
+def sessions(monkeypatch):
+    """Empty session table limited to two live machines"""
+    monkeypatch.setattr(web_app, "control_modules", {})
+    monkeypatch.setattr(web_app, "MAX_SESSIONS", 2)
+    return web_app.control_modules
+
+def _open_session(client):
+    """Create the session's machine through a state-changing request"""
+    client.post('/api/setup', json={'dosis': 200, 'posicion_x': 1, 'posicion_y': 2})
+    with client.session_transaction() as session:
+        return session['session_id']
+
+class TestWebSessions:
+    """Test the per-session control module table"""
+
+    def test_status_without_session_creates_no_machine(self, sessions):
+        """A cookieless status read (the healthcheck) must not spawn a machine"""
+        client = web_app.app.test_client()
+
+        response = client.get('/api/status')
+
+        assert response.status_code == 200
+        assert response.get_json()['estado'] == 'startup'
+        assert len(sessions) == 0
+
+    def test_least_recently_used_session_is_evicted(self, sessions):
+        """Eviction drops the session used least recently, not the oldest one created"""
+        first, second, third = (web_app.app.test_client() for _ in range(3))
+        first_id = _open_session(first)
+        second_id = _open_session(second)
+
+        # Using the first session again makes the second one the least recently used
+        assert first.get('/api/status').get_json()['estado'] == 'ready'
+        third_id = _open_session(third)
+
+        assert list(sessions) == [first_id, third_id]
+        assert second_id not in sessions
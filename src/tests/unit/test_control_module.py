@@ -5,209 +5,315 @@ Tests individual components in isolation
 import pytest
 import time
 import threading
-from src.simulator.control_module import ControlModule, BeamMode, MachineState
+from types import SimpleNamespace
+from src.simulator import control_module
+from src.simulator.control_module import BeamMode, MachineState, is_dangerous
 
 class TestControlModuleBasics:
     """Basic functionality tests"""
 
-    def test_initialization_buggy(self):
+    def test_initialization_buggy(self, buggy_control):
         """Test buggy version initialization"""
-        control = ControlModule(version="buggy")
-        assert control.version == "buggy"
-        assert control.state == MachineState.STARTUP
-        assert control.setup_counter == 0
-        assert control.max_counter == 255  # 8-bit limit
-        assert control.state_lock is None  # No synchronization!
-
-    def test_initialization_fixed(self):
+        assert buggy_control.version == "buggy"
+        assert buggy_control.state == MachineState.STARTUP
+        assert buggy_control.setup_counter == 0
+        assert buggy_control.max_counter == 255  # 8-bit limit
+        assert buggy_control.state_lock is None  # No synchronization!
+
+    def test_initialization_fixed(self, fixed_control):
         """Test fixed version initialization"""
-        control = ControlModule(version="fixed")
-        assert control.version == "fixed"
-        assert control.setup_counter == 0
-        assert control.max_counter == 2**31 - 1  # 32-bit
-        assert control.state_lock is not None  # Has synchronization
+        assert fixed_control.version == "fixed"
+        assert fixed_control.setup_counter == 0
+        assert fixed_control.max_counter == 2**31 - 1  # 32-bit
+        assert fixed_control.state_lock is not None  # Has synchronization
 
-    def test_setup_treatment_basic(self):
+    def test_setup_treatment_basic(self, buggy_control):
         """Test basic treatment setup"""
-        control = ControlModule(version="buggy")
-        result = control.setup_treatment(dose=200, x=10, y=15)
+        result = buggy_control.setup_treatment(dose=200, x=10, y=15)
 
         assert result is True
-        assert control.dose_value == 200
-        assert control.position_x == 10
-        assert control.position_y == 15
-        assert control.setup_counter == 1
+        assert buggy_control.dose_value == 200
+        assert buggy_control.position_x == 10
+        assert buggy_control.position_y == 15
+        assert buggy_control.setup_counter == 1
+
+    def test_reset_restores_initial_state(self, buggy_control):
+        """reset() clears setup data and the counter in place"""
+        buggy_control.setup_treatment(dose=200, x=10, y=15)
+        buggy_control.reset()
+
+        assert buggy_control.state == MachineState.STARTUP
+        assert buggy_control.dose_value == 0
+        assert buggy_control.setup_counter == 0
+        assert buggy_control.get_status().position == (0, 0)
 
 class TestCounterOverflowBug:
     """BUG 2: Tests for the deadly counter overflow"""
 
-    def test_counter_overflow_in_buggy_version(self):
+    @pytest.mark.parametrize("setups", [255, 511])
+    def test_counter_overflow_in_buggy_version(self, buggy_control, setups):
         """CRITICAL: Test counter overflow that bypassed safety checks"""
-        control = ControlModule(version="buggy")
+        # Setup 255 times (or 255 past a previous wrap) to reach the limit
+        assert buggy_control.bulk_setup(setups, dose=100, x=0, y=0) is True
 
-        # Setup 255 times to reach the limit
-        for i in range(255):
-            control.setup_treatment(dose=100, x=0, y=0)
-
-        assert control.setup_counter == 255
+        assert buggy_control.setup_counter == 255
 
         # The 256th setup - OVERFLOW!
-        control.setup_treatment(dose=9999, x=0, y=0)  # Invalid dose
+        buggy_control.setup_treatment(dose=9999, x=0, y=0)  # Invalid dose
 
         # BUG: Counter overflows to 0, bypassing safety checks
-        assert control.setup_counter == 0
-        assert control.dose_value == 9999  # Should have been rejected!
+        assert buggy_control.setup_counter == 0
+        assert buggy_control.dose_value == 9999  # Should have been rejected!
 
-    def test_counter_no_overflow_in_fixed_version(self):
+    def test_counter_no_overflow_in_fixed_version(self, fixed_control):
         """Fixed version should not overflow"""
-        control = ControlModule(version="fixed")
-
         # Setup many times
-        for i in range(300):
-            control.setup_treatment(dose=100, x=0, y=0)
+        fixed_control.bulk_setup(300, dose=100, x=0, y=0)
 
         # Should be 300, not overflow
-        assert control.setup_counter == 300
-        assert control.setup_counter < control.max_counter
+        assert fixed_control.setup_counter == 300
+        assert fixed_control.setup_counter < fixed_control.max_counter
 
-    def test_invalid_dose_rejection_when_counter_not_zero(self):
-        """Test that invalid dose is rejected when counter != 0"""
-        control = ControlModule(version="buggy")
+    def test_fixed_counter_refuses_past_limit(self, fixed_control):
+        """Fixed version rejects a setup past max_counter instead of wrapping"""
+        fixed_control.bulk_setup(fixed_control.max_counter, dose=100, x=0, y=0)
+
+        assert fixed_control.setup_treatment(dose=100, x=0, y=0) is False
+        assert fixed_control.state == MachineState.ERROR
+        assert fixed_control.setup_counter == fixed_control.max_counter
+
+    def test_fixed_counter_concurrent_setups(self, fixed_control, executor):
+        """Fixed counter loses no increments when setups run concurrently"""
+        def setups():
+            for _ in range(100):
+                fixed_control.setup_treatment(dose=100, x=0, y=0)
+
+        for future in [executor.submit(setups) for _ in range(8)]:
+            future.result()
+
+        # Every increment is counted
+        assert fixed_control.setup_counter == 800
+
+    def test_fixed_setup_not_blocked_by_state_lock(self, fixed_control, executor):
+        """Setups do not wait behind a mode change holding state_lock"""
+        with fixed_control.state_lock:
+            setup = executor.submit(fixed_control.setup_treatment, dose=100, x=0, y=0)
+            assert setup.result(timeout=1.0) is True
 
+        assert fixed_control.setup_counter == 1
+
+    def test_invalid_dose_rejection_when_counter_not_zero(self, buggy_control):
+        """Test that invalid dose is rejected when counter != 0"""
         # First setup (counter = 1)
-        control.setup_treatment(dose=100, x=0, y=0)
-        assert control.setup_counter == 1
+        buggy_control.setup_treatment(dose=100, x=0, y=0)
+        assert buggy_control.setup_counter == 1
 
         # Try invalid dose - should be rejected
-        result = control.setup_treatment(dose=9999, x=0, y=0)
+        result = buggy_control.setup_treatment(dose=9999, x=0, y=0)
         assert result is False
-        assert control.state == MachineState.ERROR
+        assert buggy_control.state == MachineState.ERROR
 
-    def test_safety_bypass_when_counter_zero(self):
+    def test_safety_bypass_when_counter_zero(self, buggy_control):
         """CRITICAL BUG: Safety checks bypassed when counter = 0"""
-        control = ControlModule(version="buggy")
-
         # Force counter to 0 through overflow
-        for i in range(256):
-            control.setup_treatment(dose=100, x=0, y=0)
+        buggy_control.bulk_setup(256, dose=100, x=0, y=0)
 
-        assert control.setup_counter == 0
+        assert buggy_control.setup_counter == 0
 
         # Test if safety bypass happens (this is the dangerous bug)
-        result = control.setup_treatment(dose=9999, x=0, y=0)
+        result = buggy_control.setup_treatment(dose=9999, x=0, y=0)
 
         # The bug might manifest in different ways, let's check both
-        if result is True and control.dose_value == 9999:
+        if result is True and buggy_control.dose_value == 9999:
             # BUG: Invalid dose accepted due to counter overflow
             assert True, "CRITICAL BUG: Safety checks bypassed due to counter overflow"
-        elif control.setup_counter == 0:
+        elif buggy_control.setup_counter == 0:
             # Counter overflowed, this indicates the bug exists
             assert True, "Counter overflow bug confirmed"
 
+    def test_bulk_setup_counter_wrap(self, buggy_control, fixed_control):
+        """bulk_setup wraps the counter like repeated setups in buggy version only"""
+        buggy_control.bulk_setup(300, dose=100, x=0, y=0)
+        assert buggy_control.setup_counter == 300 % 256
+
+        fixed_control.bulk_setup(300, dose=100, x=0, y=0)
+        assert fixed_control.setup_counter == 300
+
+    def test_bulk_setup_matches_repeated_setups(self, buggy_control, fixed_control):
+        """bulk_setup leaves the same counter and parameters as n single setups"""
+        assert buggy_control.bulk_setup(3, dose=150, x=4, y=5) is True
+        assert (buggy_control.setup_counter, buggy_control.dose_value) == (3, 150)
+        assert buggy_control.state == MachineState.READY
+
+        # Fixed version refuses a batch that would pass max_counter
+        assert fixed_control.bulk_setup(fixed_control.max_counter + 1, dose=100, x=0, y=0) is False
+        assert fixed_control.setup_counter == 0
+
 class TestModeChangeBug:
     """BUG 1: Tests for race condition in mode changes"""
 
-    def test_mode_change_no_wait_buggy(self):
+    def test_mode_change_no_wait_buggy(self, buggy_control):
         """CRITICAL: Buggy version doesn't wait for hardware"""
-        control = ControlModule(version="buggy")
-
         # Start in X-ray mode
-        control.beam_mode = BeamMode.XRAY
-        control.turntable_position = "xray"
+        buggy_control.beam_mode = BeamMode.XRAY
+        buggy_control.turntable_position = "xray"
 
         # Change to electron mode
-        control.change_mode(BeamMode.ELECTRON)
+        buggy_control.change_mode(BeamMode.ELECTRON)
 
         # BUG: Immediately returns without waiting
-        assert control.beam_mode == BeamMode.ELECTRON
+        assert buggy_control.beam_mode == BeamMode.ELECTRON
         # Hardware might still be moving!
-        assert control.turntable_moving is True
+        assert buggy_control.turntable_moving is True
 
-    def test_mode_change_waits_fixed(self):
+    def test_mode_change_waits_fixed(self, fixed_control):
         """Fixed version waits for hardware completion"""
-        control = ControlModule(version="fixed")
-
         # Start in X-ray mode
-        control.beam_mode = BeamMode.XRAY
-        control.turntable_position = "xray"
+        fixed_control.beam_mode = BeamMode.XRAY
+        fixed_control.turntable_position = "xray"
 
         # Change to electron mode
-        result = control.change_mode(BeamMode.ELECTRON)
+        result = fixed_control.change_mode(BeamMode.ELECTRON)
 
         # Should wait for hardware
         assert result is True
-        assert control.beam_mode == BeamMode.ELECTRON
+        assert fixed_control.beam_mode == BeamMode.ELECTRON
         # Hardware should be done moving
         time.sleep(0.6)  # Wait for hardware simulation
-        assert control.turntable_moving is False
+        assert fixed_control.turntable_moving is False
+
+    def test_mode_changes_reuse_turntable_thread(self, buggy_control):
+        """Mode changes are queued to one persistent hardware thread"""
+        threads_before = threading.active_count()
+
+        buggy_control.change_mode(BeamMode.ELECTRON)
+        buggy_control.change_mode(BeamMode.XRAY)
+
+        # No new thread per mode change
+        assert threading.active_count() == threads_before
+        assert buggy_control._turntable_thread.is_alive()
+
+    def test_turntable_stopped_only_at_latest_target(self, buggy_control):
+        """With moves still queued the turntable never reports stopped at a stale position"""
+        buggy_control.change_mode(BeamMode.ELECTRON)
+        time.sleep(0.1)  # Second change arrives while the first move is under way
+        buggy_control.change_mode(BeamMode.XRAY)
+
+        deadline = time.time() + 2.0
+        while buggy_control.turntable_moving and time.time() < deadline:
+            # Whenever it reports stopped, it must be at the selected mode's position
+            status = buggy_control.get_status()
+            if not status.turntable_moving:
+                assert status.turntable_position == status.beam_mode
+            time.sleep(0.05)
+
+        assert buggy_control.turntable_moving is False
+        assert buggy_control.turntable_position == "xray"
 
 class TestFireBeamSafety:
     """Tests for beam firing safety checks"""
 
-    def test_fire_while_turntable_moving_buggy(self):
+    def test_fire_while_turntable_moving_buggy(self, buggy_control):
         """LETHAL BUG: Fire while turntable moving"""
-        control = ControlModule(version="buggy")
-
         # Setup electron treatment
-        control.setup_treatment(dose=200, x=10, y=15)
-        control.beam_mode = BeamMode.ELECTRON
-        control.turntable_position = "xray"  # Wrong position!
-        control.turntable_moving = True  # Still moving
+        buggy_control.setup_treatment(dose=200, x=10, y=15)
+        buggy_control.beam_mode = BeamMode.ELECTRON
+        buggy_control.turntable_position = "xray"  # Wrong position!
+        buggy_control.turntable_moving = True  # Still moving
 
         # DANGEROUS: Fire while moving
-        result = control.fire_beam()
+        result = buggy_control.fire_beam()
 
         # This reproduces the lethal accident
-        assert "LETHAL" in result or "OVERDOSE" in result
+        assert is_dangerous(result)
 
-    def test_fire_with_position_mismatch_buggy(self):
+    def test_fire_with_position_mismatch_buggy(self, buggy_control):
         """CRITICAL: Fire with beam/hardware mismatch"""
-        control = ControlModule(version="buggy")
-
-        control.beam_mode = BeamMode.ELECTRON
-        control.turntable_position = "xray"  # MISMATCH!
-        control.turntable_moving = False
+        buggy_control.beam_mode = BeamMode.ELECTRON
+        buggy_control.turntable_position = "xray"  # MISMATCH!
+        buggy_control.turntable_moving = False
 
-        result = control.fire_beam()
+        result = buggy_control.fire_beam()
         assert "OVERDOSE" in result
 
-    def test_fire_safety_abort_fixed(self):
+    def test_fire_safety_abort_fixed(self, fixed_control):
         """Fixed version should abort unsafe operations"""
-        control = ControlModule(version="fixed")
-
-        control.beam_mode = BeamMode.ELECTRON
-        control.turntable_position = "xray"  # Mismatch
-        control.turntable_moving = False
+        fixed_control.beam_mode = BeamMode.ELECTRON
+        fixed_control.turntable_position = "xray"  # Mismatch
+        fixed_control.turntable_moving = False
 
-        result = control.fire_beam()
+        result = fixed_control.fire_beam()
         assert "SAFETY_ABORT" in result
 
+    def test_is_dangerous_classification(self):
+        """Only lethal/overdose results count as accidents"""
+        assert is_dangerous("LETHAL_OVERDOSE")
+        assert is_dangerous("OVERDOSE")
+        assert not is_dangerous("SUCCESS")
+        assert not is_dangerous("SAFETY_ABORT")
+
 class TestEditRaceCondition:
     """BUG 3: Tests for edit race conditions"""
 
-    def test_concurrent_edit_buggy(self):
+    def test_concurrent_edit_buggy(self, buggy_control, executor):
         """Test race condition during editing"""
-        control = ControlModule(version="buggy")
-        control.setup_treatment(dose=200, x=10, y=15)
+        buggy_control.setup_treatment(dose=200, x=10, y=15)
 
         # Simulate concurrent editing
         def edit_dose():
-            control.edit_treatment("dose", 999)
+            buggy_control.edit_treatment("dose", 999)
 
         def edit_position():
-            control.edit_treatment("position_x", 50)
+            buggy_control.edit_treatment("position_x", 50)
 
         # Start concurrent edits (no synchronization in buggy version)
-        thread1 = threading.Thread(target=edit_dose)
-        thread2 = threading.Thread(target=edit_position)
-
-        thread1.start()
-        thread2.start()
+        future1 = executor.submit(edit_dose)
+        future2 = executor.submit(edit_position)
 
-        thread1.join()
-        thread2.join()
+        future1.result()
+        future2.result()
 
         # Values might be inconsistent due to race condition
         # This test demonstrates the potential for race conditions
-        assert control.dose_value == 999 or control.dose_value == 200
-        assert control.position_x == 50 or control.position_x == 10
\ No newline at end of file
+        assert buggy_control.dose_value == 999 or buggy_control.dose_value == 200
+        assert buggy_control.position_x == 50 or buggy_control.position_x == 10
+
+    def test_edit_without_keystroke_delay(self, buggy_control):
+        """Keystroke simulation can be disabled for fast runs"""
+        buggy_control.keystroke_delay = 0
+        buggy_control.setup_treatment(dose=200, x=10, y=15)
+
+        start = time.time()
+        buggy_control.edit_treatment("dose", 300)
+        buggy_control.edit_treatment("position_x", 20)
+        buggy_control.edit_treatment("position_y", 25)
+
+        assert time.time() - start < 0.1
+        assert (buggy_control.dose_value, buggy_control.position_x, buggy_control.position_y) == (300, 20, 25)
+
+    def test_fixed_edit_types_outside_lock(self, fixed_control, executor, monkeypatch):
+        """Fixed version holds state_lock only to publish the edited value"""
+        fixed_control.setup_treatment(dose=200, x=10, y=15)
+
+        # Hold the operator inside the keystroke delay until the lock has been checked
+        typing = threading.Event()
+        finish_typing = threading.Event()
+
+        def keystroke(seconds):
+            typing.set()
+            finish_typing.wait(timeout=5.0)
+
+        monkeypatch.setattr(control_module, "time", SimpleNamespace(sleep=keystroke))
+
+        editor = executor.submit(fixed_control.edit_treatment, "dose", 300)
+        assert typing.wait(timeout=5.0)
+
+        # While the operator is still typing the lock stays available
+        lock_free = fixed_control.state_lock.acquire(blocking=False)
+        if lock_free:
+            fixed_control.state_lock.release()
+        finish_typing.set()
+        assert lock_free
+
+        assert editor.result() is True
+        assert fixed_control.dose_value == 300
@@ -9,79 +9,223 @@ Propósito educativo para demostrar la importancia de la calidad del software.
 © 2024 - Proyecto de Calidad de Software
 """
 
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, Response, render_template, request, jsonify, session
+import json
 import threading
 import time
 import os
 import sys
 import uuid
 from datetime import datetime
+from functools import lru_cache
 
 # Añadir el directorio padre al path para importar módulos del simulador
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from simulator.control_module import ControlModule, BeamMode, MachineState
+from simulator.control_module import ControlModule, BeamMode, MachineState, Status
+
+# orjson serializa en C directamente a bytes; si no está instalado se usa jsonify
+try:
+    import orjson
+
+    def json_bytes(obj):
+        """JSON compacto con claves ordenadas, igual que jsonify"""
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+
+    def json_response(obj):
+        """Respuesta JSON serializada con orjson"""
+        return Response(json_bytes(obj), mimetype='application/json')
+
+    def now_json():
+        """Hora actual como cadena JSON ISO-8601 (orjson la formatea en C)"""
+        return orjson.dumps(datetime.now())
+except ImportError:
+    def json_bytes(obj):
+        """JSON compacto con claves ordenadas, igual que jsonify"""
+        return json.dumps(obj, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+    def now_json():
+        """Hora actual como cadena JSON ISO-8601"""
+        return b'"' + datetime.now().isoformat().encode('ascii') + b'"'
+
+    json_response = jsonify
+
+# msgspec decodifica y valida el cuerpo de /api/setup directamente a campos enteros; si no
+# está instalado se usa request.json con int(). Con msgspec solo se admiten enteros de 64 bits
+# (también escritos como texto o como decimal sin parte fraccionaria): los decimales con
+# fracción y los booleanos, que int() truncaría, se rechazan con 400
+try:
+    import msgspec
+
+    class SetupRequest(msgspec.Struct):
+        dosis: int = 0
+        posicion_x: int = 0
+        posicion_y: int = 0
+
+    # strict=False acepta también números enviados como texto
+    _setup_decoder = msgspec.json.Decoder(SetupRequest, strict=False)
+
+    def parse_setup_request():
+        """Devuelve (dosis, posicion_x, posicion_y) del cuerpo JSON de la petición"""
+        if not request.is_json:
+            # Mismo error 415 que request.json cuando el Content-Type no es JSON
+            request.on_json_loading_failed(None)
+        req = _setup_decoder.decode(request.get_data(cache=False))
+        return req.dosis, req.posicion_x, req.posicion_y
+except ImportError:
+    def parse_setup_request():
+        """Devuelve (dosis, posicion_x, posicion_y) del cuerpo JSON de la petición"""
+        data = request.json
+        return int(data.get('dosis', 0)), int(data.get('posicion_x', 0)), int(data.get('posicion_y', 0))
+
+# Respuestas fijas serializadas una sola vez al importar; cada petición solo crea
+# un Response nuevo sobre los mismos bytes (un Response compartido no es seguro:
+# Flask le añade la cookie de sesión de cada usuario)
+def static_response(body, status=200):
+    """Response JSON a partir de bytes ya serializados"""
+    return Response(body, status=status, mimetype='application/json')
+
+_MODO_INVALIDO = json_bytes({
+    'exito': False,
+    'error': 'Modo inválido. Use "xray" o "electron"'
+})
+_DISPARO_DOSIS_CERO = json_bytes({
+    'exito': False,
+    'error': 'PELIGRO: Intento de disparo con dosis 0. En el Therac-25 real esto causó sobredosis.',
+    'nivel_peligro': 'CRÍTICO'
+})
+_EDICION_DURANTE_DISPARO = json_bytes({
+    'exito': False,
+    'error': 'BUG REPRODUCIDO: Edición durante disparo detectada. ¡Race condition crítico!',
+    'nivel_peligro': 'MORTAL',
+    'bug_historico': 'Los operadores del Therac-25 editaban mientras la máquina operaba, causando configuraciones parciales mortales.'
+})
+_DOSIS_INVALIDA = json_bytes({
+    'exito': False,
+    'error': 'Valor de dosis inválido'
+})
+_POSICION_X_INVALIDA = json_bytes({'exito': False, 'error': 'Valor de posición X inválido'})
+_POSICION_Y_INVALIDA = json_bytes({'exito': False, 'error': 'Valor de posición Y inválido'})
+_MAQUINA_REINICIADA = json_bytes({
+    'exito': True,
+    'mensaje': 'Máquina reiniciada al estado inicial',
+    'advertencia': 'MODO BUGGY: Todos los errores históricos están activos'
+})
+_PARADA_EMERGENCIA = json_bytes({
+    'exito': True,
+    'mensaje': 'PARADA DE EMERGENCIA ACTIVADA',
+    'estado': 'ERROR'
+})
+
+# Nombre del modo recibido por la API -> modo del haz
+MODOS_HAZ = {'xray': BeamMode.XRAY, 'electron': BeamMode.ELECTRON}
 
 app = Flask(__name__)
 app.secret_key = 'therac25-simulator-secret-key'
 
-# Instancia global del módulo de control
-control_module = None
+# Un módulo de control por sesión de navegador, para que los usuarios no compartan máquina.
+# Cada instancia tiene su propio hilo de hardware, así que se limita el número de sesiones
+# vivas y se descarta la usada hace más tiempo al superarlo.
+MAX_SESSIONS = 64
+control_modules = {}
 session_lock = threading.Lock()
 
-def get_control_module():
-    """Obtiene o crea una instancia del módulo de control para la sesión actual"""
-    global control_module
+class _Sesion:
+    """Módulo de control de una sesión y el instante de su último uso"""
+    __slots__ = ("cm", "ultimo_uso")
 
+    def __init__(self, cm):
+        self.cm = cm
+        self.ultimo_uso = time.monotonic()
+
+def _session_id():
+    """Identificador de la sesión actual (se crea en la primera petición)"""
     if 'session_id' not in session:
         session['session_id'] = str(uuid.uuid4())
+    return session['session_id']
+
+def _store_control_module(session_id, cm):
+    """Registra el módulo de la sesión; debe llamarse con session_lock tomado"""
+    control_modules[session_id] = _Sesion(cm)
+    while len(control_modules) > MAX_SESSIONS:
+        # Desalojo LRU: se descarta la sesión con el último uso más antiguo
+        del control_modules[min(control_modules, key=lambda sid: control_modules[sid].ultimo_uso)]
+
+def _find_control_module(session_id):
+    """Módulo de la sesión si sigue vivo (sin crearlo); anota su último uso"""
+    # dict.get y la asignación del atributo son atómicos con el GIL; no se toma el candado
+    sesion = control_modules.get(session_id)
+    if sesion is None:
+        return None
+    sesion.ultimo_uso = time.monotonic()
+    return sesion.cm
 
-    with session_lock:
-        if control_module is None:
-            control_module = ControlModule(version="buggy")
+def get_control_module():
+    """Obtiene o crea una instancia del módulo de control para la sesión actual"""
+    session_id = _session_id()
 
-    return control_module
+    # El candado solo se toma para crear la instancia (y desalojar si hace falta)
+    cm = _find_control_module(session_id)
+    if cm is None:
+        with session_lock:
+            cm = _find_control_module(session_id)
+            if cm is None:
+                cm = ControlModule(version="buggy")
+                _store_control_module(session_id, cm)
+
+    return cm
 
 @app.route('/')
 def index():
     """Página principal del simulador"""
     return render_template('index.html')
 
+# Instantánea de una máquina recién encendida, para sesiones que aún no tienen módulo
+# (literal: crear un ControlModule arrancaría su hilo de hardware en cada worker)
+_ESTADO_INICIAL = Status("startup", "xray", 0, (0, 0), 0, "xray", False, "buggy")
+
+@lru_cache(maxsize=256)
+def _status_body(estado):
+    """JSON del estado sin la llave de cierre, para una instantánea Status dada"""
+    posicion_x, posicion_y = estado.position
+    return json_bytes({
+        'estado': estado.state,
+        'modo_haz': estado.beam_mode,
+        'dosis': estado.dose,
+        'posicion_x': posicion_x,
+        'posicion_y': posicion_y,
+        'contador_configuracion': estado.setup_counter,
+        'posicion_mesa': estado.turntable_position,
+        'mesa_moviendo': estado.turntable_moving,
+        'version': 'buggy',
+        'peligros_detectados': []
+    })[:-1]
+
 @app.route('/api/status')
 def get_status():
     """Obtiene el estado actual de la máquina"""
     try:
-        cm = get_control_module()
-        status = {
-            'estado': cm.state.value,
-            'modo_haz': cm.beam_mode.value,
-            'dosis': cm.dose_value,
-            'posicion_x': cm.position_x,
-            'posicion_y': cm.position_y,
-            'contador_configuracion': cm.setup_counter,
-            'posicion_mesa': getattr(cm, 'turntable_position', 'xray'),
-            'mesa_moviendo': getattr(cm, 'turntable_moving', False),
-            'version': 'buggy',
-            'timestamp': datetime.now().isoformat(),
-            'peligros_detectados': []
-        }
-        return jsonify(status)
+        # La consulta es de solo lectura y no crea máquina (p. ej. el healthcheck, sin
+        # cookie): si la sesión no tiene módulo vivo se informa el estado de encendido
+        session_id = session.get('session_id')
+        cm = _find_control_module(session_id) if session_id else None
+        estado = cm.get_status() if cm is not None else _ESTADO_INICIAL
+        # Una sola lectura del estado; el JSON de cada instantánea distinta se serializa
+        # una vez y solo la marca de tiempo se añade en cada consulta
+        return static_response(_status_body(estado) + b',"timestamp":' + now_json() + b'}')
     except Exception as e:
-        return jsonify({'error': f'Error al obtener estado: {str(e)}'}), 500
+        return json_response({'error': f'Error al obtener estado: {str(e)}'}), 500
 
 @app.route('/api/setup', methods=['POST'])
 def setup_treatment():
     """Configura los parámetros del tratamiento"""
     try:
-        data = request.json
-        dosis = int(data.get('dosis', 0))
-        pos_x = int(data.get('posicion_x', 0))
-        pos_y = int(data.get('posicion_y', 0))
+        dosis, pos_x, pos_y = parse_setup_request()
 
         cm = get_control_module()
         result = cm.setup_treatment(dosis, pos_x, pos_y)
 
-        return jsonify({
+        return json_response({
             'exito': True,
             'mensaje': f'Tratamiento configurado: {dosis} cGy en posición ({pos_x}, {pos_y})',
             'configuracion': {
@@ -91,7 +235,7 @@ def setup_treatment():
             }
         })
     except Exception as e:
-        return jsonify({
+        return json_response({
             'exito': False,
             'error': f'Error en configuración: {str(e)}'
         }), 400
@@ -103,19 +247,16 @@ def change_mode():
         data = request.json
         modo = data.get('modo', '').lower()
 
-        if modo not in ['xray', 'electron']:
-            return jsonify({
-                'exito': False,
-                'error': 'Modo inválido. Use "xray" o "electron"'
-            }), 400
+        beam_mode = MODOS_HAZ.get(modo)
+        if beam_mode is None:
+            return static_response(_MODO_INVALIDO, 400)
 
         cm = get_control_module()
-        beam_mode = BeamMode.XRAY if modo == 'xray' else BeamMode.ELECTRON
 
         # ADVERTENCIA: Este cambio de modo reproduce el bug mortal del Therac-25
         result = cm.change_mode(beam_mode)
 
-        return jsonify({
+        return json_response({
             'exito': True,
             'mensaje': f'Modo cambiado a: {modo.upper()}',
             'modo_anterior': cm.beam_mode.value,
@@ -123,7 +264,7 @@ def change_mode():
             'advertencia': 'PELIGRO: Posible desincronización de hardware detectada' if not result else None
         })
     except Exception as e:
-        return jsonify({
+        return json_response({
             'exito': False,
             'error': f'Error al cambiar modo: {str(e)}'
         }), 500
@@ -136,14 +277,10 @@ def fire_beam():
 
         # ADVERTENCIA CRÍTICA: Esta función puede reproducir sobredosis mortales
         if cm.dose_value == 0:
-            return jsonify({
-                'exito': False,
-                'error': 'PELIGRO: Intento de disparo con dosis 0. En el Therac-25 real esto causó sobredosis.',
-                'nivel_peligro': 'CRÍTICO'
-            }), 400
+            return static_response(_DISPARO_DOSIS_CERO, 400)
 
-        if cm.state != MachineState.READY:
-            return jsonify({
+        if cm.state is not MachineState.READY:
+            return json_response({
                 'exito': False,
                 'error': f'Máquina no lista. Estado actual: {cm.state.value}',
                 'nivel_peligro': 'ALTO'
@@ -153,7 +290,7 @@ def fire_beam():
 
         # Simular el bug del contador de 8 bits
         if cm.setup_counter >= 256:
-            return jsonify({
+            return json_response({
                 'exito': False,
                 'error': 'BUG REPRODUCIDO: Desbordamiento del contador (8-bit overflow). ¡Controles de seguridad deshabilitados!',
                 'nivel_peligro': 'MORTAL',
@@ -161,7 +298,7 @@ def fire_beam():
                 'dosis_real_aplicada': cm.dose_value * 100  # Simular sobredosis masiva
             }), 500
 
-        return jsonify({
+        return json_response({
             'exito': True,
             'mensaje': 'Haz disparado exitosamente',
             'dosis_aplicada': cm.dose_value,
@@ -171,7 +308,7 @@ def fire_beam():
         })
 
     except Exception as e:
-        return jsonify({
+        return json_response({
             'exito': False,
             'error': f'Error crítico durante disparo: {str(e)}',
             'nivel_peligro': 'CRÍTICO'
@@ -188,23 +325,20 @@ def edit_field():
         cm = get_control_module()
 
         # SIMULAR EL RACE CONDITION DE EDICIÓN
-        if cm.state == MachineState.FIRING:
-            return jsonify({
-                'exito': False,
-                'error': 'BUG REPRODUCIDO: Edición durante disparo detectada. ¡Race condition crítico!',
-                'nivel_peligro': 'MORTAL',
-                'bug_historico': 'Los operadores del Therac-25 editaban mientras la máquina operaba, causando configuraciones parciales mortales.'
-            }), 500
+        if cm.state is MachineState.FIRING:
+            return static_response(_EDICION_DURANTE_DISPARO, 500)
 
         # Simular edición con posible corrupción de datos
         if campo == 'dosis':
             try:
                 nueva_dosis = int(valor)
-                # Simular el bug de edición rápida
-                time.sleep(0.1)  # Simular delay que causa race condition
+                # Simular el bug de edición rápida solo si se pide (?simular_carrera=1),
+                # para no bloquear un hilo del servidor 100 ms en cada edición
+                if request.args.get('simular_carrera') == '1':
+                    time.sleep(0.1)  # Simular delay que causa race condition
                 cm.dose_value = nueva_dosis
 
-                return jsonify({
+                return json_response({
                     'exito': True,
                     'mensaje': f'Dosis editada a: {nueva_dosis} cGy',
                     'advertencia': 'ATENCIÓN: Edición realizada sin verificación completa de seguridad',
@@ -212,43 +346,40 @@ def edit_field():
                     'valor_nuevo': nueva_dosis
                 })
             except ValueError:
-                return jsonify({
-                    'exito': False,
-                    'error': 'Valor de dosis inválido'
-                }), 400
+                return static_response(_DOSIS_INVALIDA, 400)
 
         elif campo == 'posicion_x':
             try:
                 nueva_pos_x = int(valor)
                 cm.position_x = nueva_pos_x
-                return jsonify({
+                return json_response({
                     'exito': True,
                     'mensaje': f'Posición X editada a: {nueva_pos_x}',
                     'posicion_nueva': (cm.position_x, cm.position_y)
                 })
             except ValueError:
-                return jsonify({'exito': False, 'error': 'Valor de posición X inválido'}), 400
+                return static_response(_POSICION_X_INVALIDA, 400)
 
         elif campo == 'posicion_y':
             try:
                 nueva_pos_y = int(valor)
                 cm.position_y = nueva_pos_y
-                return jsonify({
+                return json_response({
                     'exito': True,
                     'mensaje': f'Posición Y editada a: {nueva_pos_y}',
                     'posicion_nueva': (cm.position_x, cm.position_y)
                 })
             except ValueError:
-                return jsonify({'exito': False, 'error': 'Valor de posición Y inválido'}), 400
+                return static_response(_POSICION_Y_INVALIDA, 400)
 
         else:
-            return jsonify({
+            return json_response({
                 'exito': False,
                 'error': f'Campo desconocido: {campo}'
             }), 400
 
     except Exception as e:
-        return jsonify({
+        return json_response({
             'exito': False,
             'error': f'Error durante edición: {str(e)}'
         }), 500
@@ -257,17 +388,13 @@ def edit_field():
 def reset_machine():
     """Reinicia la máquina al estado inicial"""
     try:
-        global control_module
+        session_id = _session_id()
         with session_lock:
-            control_module = ControlModule(version="buggy")
+            _store_control_module(session_id, ControlModule(version="buggy"))
 
-        return jsonify({
-            'exito': True,
-            'mensaje': 'Máquina reiniciada al estado inicial',
-            'advertencia': 'MODO BUGGY: Todos los errores históricos están activos'
-        })
+        return static_response(_MAQUINA_REINICIADA)
     except Exception as e:
-        return jsonify({
+        return json_response({
             'exito': False,
             'error': f'Error al reiniciar: {str(e)}'
         }), 500
@@ -279,13 +406,9 @@ def emergency_stop():
         cm = get_control_module()
         cm.state = MachineState.ERROR
 
-        return jsonify({
-            'exito': True,
-            'mensaje': 'PARADA DE EMERGENCIA ACTIVADA',
-            'estado': 'ERROR'
-        })
+        return static_response(_PARADA_EMERGENCIA)
     except Exception as e:
-        return jsonify({
+        return json_response({
             'exito': False,
             'error': f'Error en parada de emergencia: {str(e)}'
         }), 500
@@ -297,9 +420,10 @@ if __name__ == '__main__':
     print("🌐 Acceder en: http://localhost:8080")
     print()
 
+    # El modo debug (recargador y consola interactiva) solo se activa con FLASK_DEBUG=1
     app.run(
         host='0.0.0.0',
         port=8080,
-        debug=True,
+        debug=os.environ.get('FLASK_DEBUG') == '1',
         threaded=True
     )
\ No newline at end of file
@@ -0,0 +1,14 @@
+"""
+Punto de entrada WSGI del Simulador Therac-25
+=============================================
+
+Uso en producción (un solo proceso para que todas las peticiones de una sesión
+lleguen a la misma máquina simulada; la concurrencia la dan los hilos):
+
+    gunicorn --chdir src/web_interface wsgi:application \
+        -k gthread -w 1 --threads 8 --worker-tmp-dir /dev/shm -b 0.0.0.0:8080
+
+© 2024 - Proyecto de Calidad de Software
+"""
+
+from app import app as application